@@ -1,14 +1,10 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import altair as alt
-import graphviz
-import folium
-from streamlit_folium import st_folium
 from datetime import datetime, timezone, timedelta
-import random
+import re
 import time
-from fpdf import FPDF
+from collections import deque
 
 # -----------------------------------------------------------------------------
 # 1. PAGE CONFIGURATION
@@ -29,7 +25,7 @@ if 'authenticated' not in st.session_state:
 if 'system_state' not in st.session_state:
     st.session_state['system_state'] = {
         'risk_index': 72.4,
-        'risk_history': [70, 71, 72, 72.4],
+        'risk_history': deque([70, 71, 72, 72.4], maxlen=24),
         'active_alerts': 3,
         'chat_history': [],
         'last_update': datetime.now(timezone.utc)
@@ -170,6 +166,54 @@ st.markdown("""
 # -----------------------------------------------------------------------------
 # 4. BACKEND LOGIC
 # -----------------------------------------------------------------------------
+RNG = np.random.default_rng()
+
+CHAT_TOPIC_RE = re.compile(r"(?P<taiwan>taiwan)|(?P<red_sea>red sea)|(?P<malacca>malacca)", re.IGNORECASE)
+CHAT_TOPIC_PRIORITY = ("taiwan", "red_sea", "malacca")
+
+CHAT_RESPONSES = {
+    "taiwan": "**FUSION ANALYSIS:** Satellite imagery (NASA GIBS) indicates nominal naval activity. However, Dark Web chatter regarding 'silicon blockade' has spiked 300%. **PREDICTION:** Low kinetic risk, High cyber risk.",
+    "red_sea": "**FUSION ANALYSIS:** Kinetic activity confirmed. **FINANCIAL IMPACT:** Rerouting costs estimated at +$1.2M per vessel. ERP correlation suggests 14-day delay for EU inventory.",
+    "malacca": "**FUSION ANALYSIS:** Strait is clear. Operational efficiency at 94%. No anomalies detected in Sentinel-2 imagery.",
+    None: "**SYSTEM:** Query processed. Integrating Satellite, News, and ERP feeds... No critical anomalies found for this vector. Please specify a target asset.",
+}
+
+MAP_ASSETS = (
+    {"name": "Strait of Malacca", "lat": 4.2105, "lon": 101.9758, "type": "Chokepoint", "risk": "CRITICAL", "conf": 98},
+    {"name": "Taiwan Strait", "lat": 23.9037, "lon": 119.6763, "type": "Chokepoint", "risk": "HIGH", "conf": 92},
+    {"name": "Port of Shanghai", "lat": 31.2304, "lon": 121.4737, "type": "Port", "risk": "MEDIUM", "conf": 85},
+    {"name": "Suez Canal", "lat": 30.5852, "lon": 32.3999, "type": "Chokepoint", "risk": "MEDIUM", "conf": 89},
+    {"name": "Rotterdam Hub", "lat": 51.9225, "lon": 4.47917, "type": "Port", "risk": "LOW", "conf": 99},
+    {"name": "Panama Canal", "lat": 9.1012, "lon": -79.6955, "type": "Chokepoint", "risk": "LOW", "conf": 95},
+)
+
+INTEL_FEED = (
+    {"id": "EVT-884", "headline": "Naval Blockade Exercise Initiated", "asset": "Taiwan Strait", "category": "Conflict", "severity": "CRITICAL", "confidence": 98, "timestamp": "14m ago", "source": "SIGINT / SAT", "why": "Troop movement detected via SAR imagery."},
+    {"id": "EVT-883", "headline": "Severe Cyclone Formation", "asset": "Bay of Bengal", "category": "Weather", "severity": "HIGH", "confidence": 94, "timestamp": "42m ago", "source": "NOAA / MET", "why": "Pressure drop > 20hPa."},
+    {"id": "EVT-882", "headline": "Labor Strike Negotiation Stalled", "asset": "Port of LA/LB", "category": "Logistics", "severity": "MEDIUM", "confidence": 82, "timestamp": "2h ago", "source": "OSINT", "why": "Sentiment analysis negative."},
+)
+
+RISK_COLORS = {"CRITICAL": "#f85149", "HIGH": "#d29922", "MEDIUM": "#58a6ff", "LOW": "#3fb950"}
+PDF_RISK_RGB = {"CRITICAL": (200, 0, 0), "HIGH": (200, 0, 0), "MEDIUM": (0, 100, 0), "LOW": (0, 100, 0)}
+
+GIBS_TILE_URL = "https://gibs.earthdata.nasa.gov/wmts/epsg3857/best/MODIS_Terra_CorrectedReflectance_TrueColor/default/{date}/GoogleMapsCompatible_Level9/{{z}}/{{y}}/{{x}}.jpg"
+
+FINANCIAL_PROJECTIONS = (
+    ("Est. Revenue at Risk (Daily)", "$ 12.5 M", "HIGH"),
+    ("Supply Chain Latency Cost", "$  2.1 M", "MEDIUM"),
+    ("Insurance Premium Risk", "+ 15.4 %", "CRITICAL"),
+    ("Alternative Logistics CapEx", "$  4.5 M", "MEDIUM"),
+)
+
+ROOT_CAUSES = pd.DataFrame({'cause': ['Geopolitical', 'Climate', 'Cyber', 'Labor'], 'count': [40, 25, 20, 15]})
+
+SYSTEM_LOGS = pd.DataFrame({
+    "Timestamp": ["10:42:01", "10:38:15", "10:35:22"],
+    "User": ["ADMIN_01", "AUTO_BOT", "SYS_CORE"],
+    "Action": ["SIMULATION_RUN", "ALERT_TRIGGER", "DATA_SYNC"],
+    "Target": ["Taiwan_Semi", "Strait_Malacca", "Global_Node"],
+}).astype({"User": "category", "Action": "category"})
+
 class EnterpriseBackend:
     @staticmethod
     def get_system_time():
@@ -179,62 +223,49 @@ class EnterpriseBackend:
     def get_global_metrics():
         # Dynamic Simulation
         current_risk = st.session_state['system_state']['risk_index']
-        drift = np.random.uniform(-0.5, 0.8)
+        drift = RNG.uniform(-0.5, 0.8)
         new_risk = max(0, min(100, current_risk + drift))
         
         st.session_state['system_state']['risk_index'] = new_risk
         st.session_state['system_state']['risk_history'].append(new_risk)
-        if len(st.session_state['system_state']['risk_history']) > 24:
-            st.session_state['system_state']['risk_history'].pop(0)
 
         return {
             "risk_index": f"{new_risk:.2f}",
+            "risk_class": "color-red" if new_risk > 70 else "color-blue",
             "risk_delta": f"{drift:+.2f}%",
             "critical_events": st.session_state['system_state']['active_alerts'],
             "escalating": 8,
             "stable_pct": 84,
             "last_refresh": EnterpriseBackend.get_system_time(),
             "user_role": "COMMANDER / TIER-1",
-            "latency": f"{np.random.randint(18, 42)}ms"
+            "latency": f"{RNG.integers(18, 42)}ms"
         }
 
     @staticmethod
     def get_map_assets():
-        return [
-            {"name": "Strait of Malacca", "lat": 4.2105, "lon": 101.9758, "type": "Chokepoint", "risk": "CRITICAL", "conf": 98},
-            {"name": "Taiwan Strait", "lat": 23.9037, "lon": 119.6763, "type": "Chokepoint", "risk": "HIGH", "conf": 92},
-            {"name": "Port of Shanghai", "lat": 31.2304, "lon": 121.4737, "type": "Port", "risk": "MEDIUM", "conf": 85},
-            {"name": "Suez Canal", "lat": 30.5852, "lon": 32.3999, "type": "Chokepoint", "risk": "MEDIUM", "conf": 89},
-            {"name": "Rotterdam Hub", "lat": 51.9225, "lon": 4.47917, "type": "Port", "risk": "LOW", "conf": 99},
-            {"name": "Panama Canal", "lat": 9.1012, "lon": -79.6955, "type": "Chokepoint", "risk": "LOW", "conf": 95},
-        ]
+        return MAP_ASSETS
 
     @staticmethod
     def get_intelligence_feed():
-        return [
-            {"id": "EVT-884", "headline": "Naval Blockade Exercise Initiated", "asset": "Taiwan Strait", "category": "Conflict", "severity": "CRITICAL", "confidence": 98, "timestamp": "14m ago", "source": "SIGINT / SAT", "why": "Troop movement detected via SAR imagery."},
-            {"id": "EVT-883", "headline": "Severe Cyclone Formation", "asset": "Bay of Bengal", "category": "Weather", "severity": "HIGH", "confidence": 94, "timestamp": "42m ago", "source": "NOAA / MET", "why": "Pressure drop > 20hPa."},
-            {"id": "EVT-882", "headline": "Labor Strike Negotiation Stalled", "asset": "Port of LA/LB", "category": "Logistics", "severity": "MEDIUM", "confidence": 82, "timestamp": "2h ago", "source": "OSINT", "why": "Sentiment analysis negative."},
-        ]
+        return INTEL_FEED
 
     @staticmethod
     def get_analytics_data():
         history = st.session_state['system_state']['risk_history']
-        times = [datetime.now() - timedelta(hours=i) for i in range(len(history))][::-1]
-        velocity = pd.DataFrame({'time': times, 'risk_score': history})
-        root_causes = pd.DataFrame({'cause': ['Geopolitical', 'Climate', 'Cyber', 'Labor'], 'count': [40, 25, 20, 15]})
-        return velocity, root_causes
+        times = pd.date_range(end=datetime.now(), periods=len(history), freq=timedelta(hours=1))
+        velocity = pd.DataFrame({'time': times, 'risk_score': list(history)})
+        return velocity, ROOT_CAUSES
 
     @staticmethod
     def get_logs():
-        return pd.DataFrame([
-            {"Timestamp": "10:42:01", "User": "ADMIN_01", "Action": "SIMULATION_RUN", "Target": "Taiwan_Semi"},
-            {"Timestamp": "10:38:15", "User": "AUTO_BOT", "Action": "ALERT_TRIGGER", "Target": "Strait_Malacca"},
-            {"Timestamp": "10:35:22", "User": "SYS_CORE", "Action": "DATA_SYNC", "Target": "Global_Node"},
-        ])
+        return SYSTEM_LOGS
 
     @staticmethod
+    @st.cache_data(ttl=300, show_spinner=False)
     def generate_pdf_brief():
+        from fpdf import FPDF
+
+        generated_at = EnterpriseBackend.get_system_time()
         pdf = FPDF()
         pdf.add_page()
         
@@ -244,7 +275,7 @@ class EnterpriseBackend:
         
         pdf.set_font("Arial", size=10)
         pdf.set_text_color(100, 100, 100)
-        pdf.cell(0, 10, txt=f"Report Generated: {EnterpriseBackend.get_system_time()} | CLASSIFICATION: SECRET//NOFORN", ln=1, align='L')
+        pdf.cell(0, 10, txt=f"Report Generated: {generated_at} | CLASSIFICATION: SECRET//NOFORN", ln=1, align='L')
         
         y_pos = pdf.get_y()
         pdf.line(10, y_pos, 200, y_pos)
@@ -263,14 +294,7 @@ class EnterpriseBackend:
         pdf.set_font("Courier", size=10) 
         pdf.set_fill_color(240, 240, 240)
         
-        financials = [
-            ("Est. Revenue at Risk (Daily)", "$ 12.5 M", "HIGH"),
-            ("Supply Chain Latency Cost", "$  2.1 M", "MEDIUM"),
-            ("Insurance Premium Risk", "+ 15.4 %", "CRITICAL"),
-            ("Alternative Logistics CapEx", "$  4.5 M", "MEDIUM")
-        ]
-        
-        for metric, value, risk in financials:
+        for metric, value, risk in FINANCIAL_PROJECTIONS:
             pdf.cell(90, 8, txt=metric, border=1, fill=True)
             pdf.cell(50, 8, txt=value, border=1, align='R')
             pdf.cell(50, 8, txt=risk, border=1, align='C')
@@ -284,31 +308,19 @@ class EnterpriseBackend:
         
         assets = EnterpriseBackend.get_map_assets()
         for asset in assets:
-            if asset['risk'] in ['CRITICAL', 'HIGH']:
-                pdf.set_text_color(200, 0, 0) 
-                status = f"[{asset['risk']}]"
-            else:
-                pdf.set_text_color(0, 100, 0)
-                status = f"[{asset['risk']}]"
-                
-            pdf.cell(40, 8, txt=status, border=0)
+            pdf.set_text_color(*PDF_RISK_RGB[asset['risk']])
+            pdf.cell(40, 8, txt=f"[{asset['risk']}]", border=0)
             pdf.set_text_color(0, 0, 0)
             pdf.cell(0, 8, txt=f"{asset['name']} ({asset['type']})", ln=1)
 
-        return pdf.output(dest='S').encode('latin-1')
+        return pdf.output(dest='S').encode('latin-1'), generated_at
 
     @staticmethod
     def ai_chat_response(query):
         t = EnterpriseBackend.get_system_time()
-        q = query.lower()
-        if "taiwan" in q:
-            return f"[{t}] **FUSION ANALYSIS:** Satellite imagery (NASA GIBS) indicates nominal naval activity. However, Dark Web chatter regarding 'silicon blockade' has spiked 300%. **PREDICTION:** Low kinetic risk, High cyber risk."
-        elif "red sea" in q:
-            return f"[{t}] **FUSION ANALYSIS:** Kinetic activity confirmed. **FINANCIAL IMPACT:** Rerouting costs estimated at +$1.2M per vessel. ERP correlation suggests 14-day delay for EU inventory."
-        elif "malacca" in q:
-            return f"[{t}] **FUSION ANALYSIS:** Strait is clear. Operational efficiency at 94%. No anomalies detected in Sentinel-2 imagery."
-        else:
-            return f"[{t}] **SYSTEM:** Query processed. Integrating Satellite, News, and ERP feeds... No critical anomalies found for this vector. Please specify a target asset."
+        found = {m.lastgroup for m in CHAT_TOPIC_RE.finditer(query)}
+        topic = next((name for name in CHAT_TOPIC_PRIORITY if name in found), None)
+        return f"[{t}] {CHAT_RESPONSES[topic]}"
 
 # -----------------------------------------------------------------------------
 # 5. UI COMPONENTS
@@ -365,7 +377,7 @@ def render_enterprise_header():
     <div class="metrics-section">
         <div class="metric-box">
             <div class="metric-label">GLOBAL RISK</div>
-            <div class="metric-value {'color-red' if float(metrics['risk_index']) > 70 else 'color-blue'}">
+            <div class="metric-value {metrics['risk_class']}">
                 {metrics['risk_index']} <span class="metric-delta" style="color:#8b949e">{metrics['risk_delta']}</span>
             </div>
         </div>
@@ -405,19 +417,20 @@ def render_sidebar():
         st.markdown("---")
         st.info("System Status: **ONLINE**")
 
-def render_map_section():
-    st.markdown("### 🗺️ GLOBAL THEATER OVERVIEW")
+@st.cache_data(max_entries=2, show_spinner=False)
+def build_theater_map(imagery_date):
+    import folium
+
     m = folium.Map(location=[20, 80], zoom_start=2, tiles=None)
     folium.TileLayer('CartoDB dark_matter', name="Dark").add_to(m)
     
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     folium.TileLayer(
-        tiles=f'https://gibs.earthdata.nasa.gov/wmts/epsg3857/best/MODIS_Terra_CorrectedReflectance_TrueColor/default/{today}/GoogleMapsCompatible_Level9/{{z}}/{{y}}/{{x}}.jpg',
+        tiles=GIBS_TILE_URL.format(date=imagery_date),
         attr='NASA GIBS', overlay=True, opacity=0.5
     ).add_to(m)
 
     for a in EnterpriseBackend.get_map_assets():
-        c = {"CRITICAL": "#f85149", "HIGH": "#d29922", "MEDIUM": "#58a6ff", "LOW": "#3fb950"}.get(a['risk'])
+        c = RISK_COLORS[a['risk']]
         
         tooltip = f"""
         <div style='font-family:sans-serif; padding:5px;'>
@@ -430,8 +443,52 @@ def render_map_section():
         folium.CircleMarker([a['lat'], a['lon']], radius=6, color=c, fill=True, fill_opacity=0.9, popup=tooltip, tooltip=a['name']).add_to(m)
         if a['risk'] == "CRITICAL":
             folium.Circle([a['lat'], a['lon']], radius=500000, color=c, weight=1, fill=True, fill_opacity=0.1).add_to(m)
-            
-    st_folium(m, height=420, use_container_width=True)
+
+    return m
+
+def render_map_section():
+    from streamlit_folium import st_folium
+
+    st.markdown("### 🗺️ GLOBAL THEATER OVERVIEW")
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    m = build_theater_map(today)
+    st_folium(m, height=420, use_container_width=True, returned_objects=[])
+
+@st.cache_resource
+def build_digital_twin():
+    import graphviz
+
+    g = graphviz.Digraph()
+    g.attr(rankdir='LR', bgcolor='transparent')
+    g.attr('node', shape='box', style='filled', color='white', fontname='Sans-Serif')
+    g.node('A', 'Taiwan Semi', fillcolor='#4a1c1c', fontcolor='white') 
+    g.node('B', 'Assembly Node', fillcolor='#3a2e1c', fontcolor='white') 
+    g.node('C', 'Global Logistics', fillcolor='#1c3a2e', fontcolor='white')
+    g.node('D', 'End Market', fillcolor='#1c2e4a', fontcolor='white')
+    g.edge('A', 'B'); g.edge('B', 'C'); g.edge('C', 'D')
+    return g
+
+def submit_analyst_query():
+    q = st.session_state['analyst_query']
+    st.session_state['chat_history'].append({"role": "user", "content": q})
+    st.session_state['chat_history'].append({"role": "assistant", "content": EnterpriseBackend.ai_chat_response(q)})
+
+@st.fragment
+def render_analyst_chat():
+    st.markdown("#### 💬 AI FUSION ANALYST (Multi-INT)")
+    cnt = st.container(height=300)
+    with cnt:
+        for msg in st.session_state['chat_history']:
+            st.chat_message(msg['role']).write(msg['content'])
+    st.chat_input("Ask about global assets, financial impact, or weather patterns...", key="analyst_query", on_submit=submit_analyst_query)
+
+@st.fragment
+def render_simulation_panel():
+    st.markdown("#### SCENARIO SIMULATOR")
+    d = st.slider("Disruption Duration (Days)", 1, 60, 7)
+    impact = d * 12.5
+    st.metric("Estimated Revenue Impact", f"${impact:,.1f}M", "High Confidence")
+    st.progress(int(min(100, d*2)))
 
 # -----------------------------------------------------------------------------
 # 6. MAIN APPLICATION LOGIC
@@ -449,6 +506,7 @@ def main_dashboard():
         t1, t2, t3, t4, t5 = st.tabs(["📊 ANALYTICS", "💬 AI ANALYST", "🕸️ DIGITAL TWIN", "🎲 SIMULATION", "📜 LOGS"])
         
         with t1:
+            import altair as alt
             vel_df, cause_df = EnterpriseBackend.get_analytics_data()
             c1, c2 = st.columns(2)
             with c1:
@@ -462,38 +520,14 @@ def main_dashboard():
                 st.altair_chart(alt.Chart(cause_df).mark_arc(innerRadius=50).encode(theta='count', color='cause').properties(height=220), use_container_width=True)
                 
         with t2:
-            st.markdown("#### 💬 AI FUSION ANALYST (Multi-INT)")
-            cnt = st.container(height=300)
-            with cnt:
-                for msg in st.session_state['chat_history']:
-                    st.chat_message(msg['role']).write(msg['content'])
-            q = st.chat_input("Ask about global assets, financial impact, or weather patterns...")
-            if q:
-                st.session_state['chat_history'].append({"role": "user", "content": q})
-                with st.spinner("Processing intelligence streams..."):
-                    time.sleep(0.8) 
-                    resp = EnterpriseBackend.ai_chat_response(q)
-                    st.session_state['chat_history'].append({"role": "assistant", "content": resp})
-                st.rerun()
+            render_analyst_chat()
 
         with t3:
             st.markdown("#### SUPPLY CHAIN DIGITAL TWIN")
-            g = graphviz.Digraph()
-            g.attr(rankdir='LR', bgcolor='transparent')
-            g.attr('node', shape='box', style='filled', color='white', fontname='Sans-Serif')
-            g.node('A', 'Taiwan Semi', fillcolor='#4a1c1c', fontcolor='white') 
-            g.node('B', 'Assembly Node', fillcolor='#3a2e1c', fontcolor='white') 
-            g.node('C', 'Global Logistics', fillcolor='#1c3a2e', fontcolor='white')
-            g.node('D', 'End Market', fillcolor='#1c2e4a', fontcolor='white')
-            g.edge('A', 'B'); g.edge('B', 'C'); g.edge('C', 'D')
-            st.graphviz_chart(g, use_container_width=True)
+            st.graphviz_chart(build_digital_twin(), use_container_width=True)
 
         with t4:
-            st.markdown("#### SCENARIO SIMULATOR")
-            d = st.slider("Disruption Duration (Days)", 1, 60, 7)
-            impact = d * 12.5
-            st.metric("Estimated Revenue Impact", f"${impact:,.1f}M", "High Confidence")
-            st.progress(int(min(100, d*2)))
+            render_simulation_panel()
             
         with t5:
             st.markdown("#### SYSTEM LOGS")
@@ -501,9 +535,9 @@ def main_dashboard():
             
     with c_feed:
         st.subheader("📡 INTEL FEED")
-        pdf_bytes = EnterpriseBackend.generate_pdf_brief()
+        pdf_bytes, generated_at = EnterpriseBackend.generate_pdf_brief()
         st.download_button(
-            label="DOWNLOAD INTELLIGENCE BRIEF",
+            label=f"DOWNLOAD INTELLIGENCE BRIEF ({generated_at})",
             data=pdf_bytes,
             file_name="Avellon_Financial_Risk_Brief.pdf",
             mime="application/pdf",